@@ -2,57 +2,113 @@ import aiohttp
 import asyncio
 import time
 import logging
-import json
+import functools
+import orjson
 import random
-from typing import List, Tuple, Optional, Dict
+import re
+import socket
+from typing import List, Tuple, Optional, Dict, Union, Callable, Awaitable
 from collections import defaultdict
-from bs4 import BeautifulSoup, SoupStrainer
-from urllib.parse import urljoin
+from urllib.parse import urljoin, urlencode, urlsplit
 from datetime import datetime, timedelta
-from contextlib import asynccontextmanager
-
-logging.basicConfig(
-    level=logging.DEBUG, 
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('purchase_log.txt'),
-        logging.StreamHandler()
-    ]
-)
+
 logger = logging.getLogger(__name__)
 
+# Extraction directe du loginToken depuis les octets bruts de la page de connexion
+_LOGIN_TOKEN_RE = re.compile(rb'name=["\']loginToken["\'][^>]*\bvalue=["\']([^"\']+)', re.I)
+
+# Paramètres des requêtes d'achat construits une seule fois au chargement du module
+_PURCHASE_TIMEOUT = aiohttp.ClientTimeout(total=10)
+_PURCHASE_HEADERS = {
+    'Content-Type': 'application/x-www-form-urlencoded',
+    'Cache-Control': 'no-cache, no-store, must-revalidate',
+    'Pragma': 'no-cache'
+}
+_PURCHASE_JSON_HEADERS = {
+    **_PURCHASE_HEADERS,
+    'Content-Type': 'application/json'
+}
+# En-têtes automatiques d'aiohttp déjà fournis par la session ou par _PURCHASE_HEADERS
+_PURCHASE_SKIP_AUTO_HEADERS = frozenset({'User-Agent', 'Accept-Encoding', 'Content-Type'})
+
+# Synchronisation : avance de la pré-initialisation et durée de l'attente active finale (s)
+_WARMUP_LEAD = 3.0
+_FINAL_SPIN = 0.002
+
+# Tentatives par lot et nombre de lots prévus sur une même échéance : dimensionne le pool de connexions
+_PURCHASE_ATTEMPTS = 5
+_MAX_LOTS_PER_DEADLINE = 10
+
 class LoginError(Exception):
     pass
 
-@asynccontextmanager
-async def get_optimized_session(timeout: float):
-    """Session optimisée avec gestion améliorée des connexions"""
-    timeout_obj = aiohttp.ClientTimeout(
-        total=timeout,     
-        connect=10.0,      # Augmentation du timeout de connexion
-        sock_connect=10.0, 
-        sock_read=15.0     # Lecture plus longue
-    )
-    
-    conn = aiohttp.TCPConnector(
-        limit=50,              # Augmentation de la limite de connexions
-        limit_per_host=15,     # Limite par hôte augmentée
+def _make_resolver() -> aiohttp.abc.AbstractResolver:
+    """Résolveur DNS asynchrone (c-ares) avec repli sur le résolveur threadé"""
+    try:
+        from aiohttp.resolver import AsyncResolver
+        return AsyncResolver()
+    except (ImportError, RuntimeError) as e:
+        # aiodns absent ou boucle incompatible (ProactorEventLoop sous Windows)
+        logger.warning(f"AsyncResolver indisponible, repli sur ThreadedResolver : {e}")
+        from aiohttp.resolver import ThreadedResolver
+        return ThreadedResolver()
+
+class PinnedResolver(aiohttp.abc.AbstractResolver):
+    """Résolveur qui fige les adresses résolues pour éviter toute requête DNS pendant l'achat"""
+
+    def __init__(self, resolver: aiohttp.abc.AbstractResolver):
+        self._resolver = resolver
+        self._pinned: Dict[Tuple[str, int], List[dict]] = {}
+
+    async def pin(self, host: str, port: int, family: socket.AddressFamily = socket.AF_INET) -> List[dict]:
+        """Résout l'hôte maintenant et réutilise cette réponse jusqu'au prochain appel"""
+        addrs = await self._resolver.resolve(host, port, family=family)
+        self._pinned[(host, port)] = addrs
+        return addrs
+
+    async def resolve(self, host: str, port: int = 0, family: socket.AddressFamily = socket.AF_INET) -> List[dict]:
+        pinned = self._pinned.get((host, port))
+        if pinned is not None:
+            return pinned
+        return await self._resolver.resolve(host, port, family=family)
+
+    async def close(self) -> None:
+        await self._resolver.close()
+
+def get_optimized_connector(resolver: Optional[aiohttp.abc.AbstractResolver] = None) -> aiohttp.TCPConnector:
+    """Connecteur optimisé : pool keep-alive et cache DNS"""
+    return aiohttp.TCPConnector(
+        # Une connexion par tentative pour chaque lot d'une même échéance, marge pour les lots concurrents
+        limit=2 * _PURCHASE_ATTEMPTS * _MAX_LOTS_PER_DEADLINE,
+        limit_per_host=_PURCHASE_ATTEMPTS * _MAX_LOTS_PER_DEADLINE,
         ttl_dns_cache=3600,    
         use_dns_cache=True,
+        resolver=resolver or _make_resolver(),
         force_close=False,
         keepalive_timeout=90,  # Keepalive plus long
         ssl=False,             
         enable_cleanup_closed=True
     )
 
+def get_optimized_session(timeout: float, connector: aiohttp.TCPConnector) -> aiohttp.ClientSession:
+    """Session optimisée sur un connecteur partagé, avec ses propres cookies"""
+    timeout_obj = aiohttp.ClientTimeout(
+        total=timeout,     
+        connect=10.0,      # Augmentation du timeout de connexion
+        sock_connect=10.0, 
+        sock_read=15.0     # Lecture plus longue
+    )
+
     try:
-        session = aiohttp.ClientSession(
-            connector=conn,
+        return aiohttp.ClientSession(
+            connector=connector,
+            connector_owner=False,  # Le connecteur survit à la session
             timeout=timeout_obj,
             headers={
                 "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
                 "Accept": "application/json, text/html,application/xhtml+xml",
                 "Accept-Language": "fr-FR,fr;q=0.9,en-US;q=0.8",
+                "Accept-Encoding": "gzip, deflate",
                 'X-Requested-With': 'XMLHttpRequest',
                 'Connection': 'keep-alive',
                 'Cache-Control': 'no-cache'
@@ -60,273 +116,408 @@ async def get_optimized_session(timeout: float):
             cookie_jar=aiohttp.CookieJar(unsafe=True)
         )
 
-        try:
-            yield session
-        finally:
-            pass
-
     except Exception as e:
         logger.error(f"Erreur de création de session : {e}")
         raise
 
+# Connecteur partagé entre les lots : conserve keep-alive et cache DNS d'une requête à l'autre.
+# Chaque lot garde sa propre session, donc ses propres cookies et jeton CSRF.
+_connector: Optional[aiohttp.TCPConnector] = None
+_resolver: Optional[PinnedResolver] = None
+
+async def get_connector() -> aiohttp.TCPConnector:
+    """Retourne le connecteur partagé, créé à la première utilisation"""
+    global _connector, _resolver
+    if _connector is None or _connector.closed:
+        _resolver = PinnedResolver(_make_resolver())
+        _connector = get_optimized_connector(resolver=_resolver)
+    return _connector
+
+async def pin_dns(url: str) -> None:
+    """Pré-résout l'hôte de l'URL sur le connecteur partagé avant le lancement des achats"""
+    await get_connector()
+    parts = urlsplit(url)
+    port = parts.port or (443 if parts.scheme == 'https' else 80)
+    try:
+        addrs = await _resolver.pin(parts.hostname, port)
+        # Le cache DNS du connecteur est consulté avant le résolveur : l'invalider pour relire la réponse figée
+        _connector.clear_dns_cache(parts.hostname, port)
+        logger.debug(f"DNS figé pour {parts.hostname}:{port} -> {[a['host'] for a in addrs]}")
+    except OSError as e:
+        logger.warning(f"Pré-résolution DNS impossible pour {parts.hostname}: {e}")
+
+async def close_connector() -> None:
+    """Ferme le connecteur partagé (arrêt de l'application)"""
+    global _connector, _resolver
+    if _connector is not None:
+        await _connector.close()
+        _connector = None
+    if _resolver is not None:
+        await _resolver.close()
+        _resolver = None
+
 async def fetch_login_page(session: aiohttp.ClientSession, login_url: str) -> Tuple[str, str]:
     """Fetch login page and extract CSRF token and login token"""
     async with session.get(login_url) as response:
-        text = await response.text()
+        raw = await response.read()
         csrf_cookie = response.cookies.get('ceo_csrf_cookie')
         if not csrf_cookie:
             raise LoginError("CSRF cookie missing")
 
-        # Optimized BeautifulSoup parsing with lxml and SoupStrainer
-        soup = BeautifulSoup(text, 'lxml', parse_only=SoupStrainer('input', {'name': 'loginToken'}))
-        login_token = soup.find('input', {'name': 'loginToken'})
-        if not login_token or 'value' not in login_token.attrs:
+        # Regex précompilée : évite la construction d'un arbre HTML complet
+        match = _LOGIN_TOKEN_RE.search(raw)
+        if not match:
             raise LoginError("Login token not found")
 
-        return csrf_cookie.value, login_token['value']
+        return csrf_cookie.value, match.group(1).decode('utf-8')
 
 async def login_to_website(
+    session: aiohttp.ClientSession,
     base_url: str,
     login_string: str,
     login_pass: str,
-    timeout: float = 2.0,
 ) -> Tuple[bool, float, Dict[str, float], Optional[aiohttp.ClientSession], Optional[str]]:
     """Optimized login function with better error handling and performance"""
     start_time = time.monotonic()
     metrics = defaultdict(float)
 
-    async with get_optimized_session(timeout) as session:
-        try:
-            login_url = urljoin(base_url, 'login')
-
-            # Fetch login page and tokens
-            login_start = time.monotonic()
-            csrf_token, login_token = await fetch_login_page(session, login_url)
-            metrics['login_preparation'] = time.monotonic() - login_start
-
-            # Perform authentication
-            auth_start = time.monotonic()
-            login_data = {
-                'ceo_csrf_token': csrf_token,
-                'loginToken': login_token,
-                'login_string': login_string,
-                'login_pass': login_pass
-            }
+    try:
+        login_url = urljoin(base_url, 'login')
 
-            async with session.post(login_url, data=login_data) as auth_response:
-                auth_text = await auth_response.text()
-                if "error" in auth_text.lower() or 'login' in str(auth_response.url):
-                    raise LoginError("Login failed")
-                metrics['authentication'] = time.monotonic() - auth_start
+        # Fetch login page and tokens
+        login_start = time.monotonic()
+        csrf_token, login_token = await fetch_login_page(session, login_url)
+        metrics['login_preparation'] = time.monotonic() - login_start
+
+        # Perform authentication
+        auth_start = time.monotonic()
+        login_data = {
+            'ceo_csrf_token': csrf_token,
+            'loginToken': login_token,
+            'login_string': login_string,
+            'login_pass': login_pass
+        }
 
-            total_time = time.monotonic() - start_time
-            metrics['total'] = total_time
+        async with session.post(login_url, data=login_data) as auth_response:
+            auth_bytes = await auth_response.read()
+            if b"error" in auth_bytes.lower() or 'login' in str(auth_response.url):
+                raise LoginError("Login failed")
+            metrics['authentication'] = time.monotonic() - auth_start
 
-            return True, total_time, dict(metrics), session, csrf_token
+        total_time = time.monotonic() - start_time
+        metrics['total'] = total_time
 
-        except Exception as e:
-            logger.error(f"Error during login process: {str(e)}")
-            total_time = time.monotonic() - start_time
-            return False, total_time, {'error': str(e), 'total': total_time}, None, None
+        return True, total_time, dict(metrics), session, csrf_token
 
-async def perform_concurrent_purchases(
+    except Exception as e:
+        logger.error(f"Error during login process: {str(e)}")
+        total_time = time.monotonic() - start_time
+        return False, total_time, {'error': str(e), 'total': total_time}, None, None
+
+async def _aiohttp_post(
+    session: aiohttp.ClientSession,
+    purchase_url: str,
+    purchase_body: bytes,
+    purchase_headers: Dict[str, str]
+) -> Tuple[int, bytes]:
+    async with session.post(
+        purchase_url,
+        data=purchase_body,
+        timeout=_PURCHASE_TIMEOUT,
+        headers=purchase_headers,
+        skip_auto_headers=_PURCHASE_SKIP_AUTO_HEADERS
+    ) as response:
+        return response.status, await response.read()
+
+async def _httpx_post(
+    client: "httpx.AsyncClient",
+    purchase_url: str,
+    purchase_body: bytes,
+    purchase_headers: Dict[str, str]
+) -> Tuple[int, bytes]:
+    response = await client.post(purchase_url, content=purchase_body, headers=purchase_headers)
+    return response.status_code, response.content
+
+def _make_http2_client(session: aiohttp.ClientSession) -> Optional["httpx.AsyncClient"]:
+    """Client HTTP/2 reprenant les en-têtes et cookies de la session connectée"""
+    try:
+        import httpx
+        return httpx.AsyncClient(
+            http2=True,
+            verify=False,
+            timeout=_PURCHASE_TIMEOUT.total,
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=20),
+            # En-têtes propres à la connexion interdits en HTTP/2
+            headers={k: v for k, v in session.headers.items() if k.lower() != 'connection'},
+            cookies={cookie.key: cookie.value for cookie in session.cookie_jar}
+        )
+    except ImportError as e:
+        logger.warning(f"HTTP/2 indisponible (httpx[http2] requis), repli sur aiohttp : {e}")
+        return None
+
+async def _open_http2_client(
     session: aiohttp.ClientSession,
     base_url: str,
-    csrf_token: str,
+    timeout: float
+) -> Optional["httpx.AsyncClient"]:
+    """Ouvre et pré-initialise le client HTTP/2, ou None si HTTP/2 n'est pas négocié"""
+    if timeout <= 0:
+        logger.warning("Plus de temps pour pré-initialiser HTTP/2 avant l'échéance, repli sur aiohttp")
+        return None
+
+    client = _make_http2_client(session)
+    if client is None:
+        return None
+
+    negotiated = False
+    try:
+        response = await client.get(base_url, timeout=timeout)
+        # httpx ne négocie HTTP/2 qu'en TLS (ALPN) : en clair, il reste en HTTP/1.1
+        negotiated = response.http_version == "HTTP/2"
+        if not negotiated:
+            logger.warning(f"HTTP/2 non négocié ({response.http_version}), repli sur aiohttp")
+    except Exception as e:
+        logger.warning(f"Échec de pré-initialisation HTTP/2, repli sur aiohttp : {e}")
+    finally:
+        if not negotiated:
+            await client.aclose()
+
+    return client if negotiated else None
+
+async def _purchase_attempt(
+    post: Callable[[], Awaitable[Tuple[int, bytes]]],
     lot: int,
-    buyer_code: str,
-    attempts: int = 5
-) -> Optional[Dict]:
-    """Tentatives d'achat concurrentes avec gestion d'erreurs détaillée"""
-    purchase_url = urljoin(base_url, 'achat/action')
-    purchase_data = {
-            'ceo_csrf_token': csrf_token,
-            'lot': str(lot),
-            'code': buyer_code
-        }
+    purchase_time: datetime
+) -> dict:
+    """Une tentative d'achat pour un lot, corps de requête déjà encodé"""
+    sent_ns = time.time_ns()
+    start_time = time.perf_counter()
 
-    # Préparer toutes les requêtes à l'avance
-    async def single_purchase_attempt():
-        start_time = time.perf_counter()
-        logger.info(f"Tentative d'achat pour le Lot {lot} à {datetime.now().strftime('%H:%M:%S.%f')}")
+    def log_attempt():
+        # Horodatage formaté après coup, hors du chemin critique
+        if logger.isEnabledFor(logging.INFO):
+            sent_at = datetime.fromtimestamp(sent_ns / 1e9).strftime('%H:%M:%S.%f')
+            logger.info(f"Tentative d'achat pour le Lot {lot} à {sent_at}")
+
+    try:
+        status, raw = await post()
+        request_time = (time.perf_counter() - start_time) * 1000
+        log_attempt()
+        response_text = raw.decode('utf-8', 'replace')
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Temps de la requête pour le Lot {lot}: {request_time:.2f}ms")
+            logger.debug(f"Statut de la réponse pour Lot {lot}: {status}")
+            logger.debug(f"Texte de la réponse: {response_text[:500]}...")
+
+        # Seules les réponses JSON valides sont retenues comme candidates
         try:
-            async with session.post(purchase_url, data=purchase_data, timeout=aiohttp.ClientTimeout(total=10), headers={'Cache-Control': 'no-cache, no-store'}) as response:
-                response_text = await response.text()
-                request_time = (time.perf_counter() - start_time) * 1000  # ms
-
-                logger.debug(f"Temps de la requête pour le Lot {lot}: {request_time:.2f}ms")
-                logger.debug(f"Statut de la réponse pour Lot {lot}: {response.status}")
-                logger.debug(f"Texte de la réponse: {response_text[:500]}...")  # Tronqué pour éviter les logs énormes
-
-                try:
-                    parsed_response = json.loads(response_text)
-                    success = response.status == 200 and parsed_response.get('statut') == 'success'
-                    
-                    return {
-                        'request': True,
-                        'success': success,
-                        'status_code': response.status,
-                        'response_text': response_text,
-                        'duration_ms': request_time,
-                        'parsed_response': parsed_response,
-                        'timestamp': datetime.now()
-                    }
-                except json.JSONDecodeError:
-                    logger.warning(f"Impossible de décoder la réponse JSON pour Lot {lot}")
-                    return {
-                        'request': False,
-                        'success': False,
-                        'status_code': response.status,
-                        'response_text': response_text,
-                        'duration_ms': request_time,
-                        'error': 'JSON decode error',
-                        'timestamp': datetime.now()
-                    }
-
-        except aiohttp.ClientConnectionError as conn_err:
-            logger.error(f"Erreur de connexion pour Lot {lot}: {conn_err}")
-        except aiohttp.ClientResponseError as resp_err:
-            logger.error(f"Erreur de réponse pour Lot {lot}: {resp_err}")
-        except asyncio.TimeoutError:
-            logger.error(f"Délai dépassé pour Lot {lot}")
-        except Exception as e:
-            logger.error(f"Erreur inattendue pour Lot {lot}: {type(e).__name__} - {e}")
+            parsed_response = orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            logger.warning(f"Impossible de décoder la réponse JSON pour Lot {lot}")
+            return {
+                'lot': lot,
+                'success': False,
+                'status': status,
+                'purchase_times': purchase_time,
+                'response_text': response_text,
+                'duration_ms': request_time,
+                'error': 'JSON decode error'
+            }
 
+        success = status == 200 and isinstance(parsed_response, dict) and parsed_response.get('statut') == 'success'
         return {
+            'lot': lot,
+            'success': success,
+            'status': status,
+            'purchase_times': purchase_time,
+            'response_text': response_text,
+            'parsed_response': parsed_response,
+            'duration_ms': request_time
+        }
+    except Exception as e:
+        log_attempt()
+        logger.error(f"Erreur de requête: {str(e)}")
+        return {
+            'lot': lot,
             'success': False,
-            'error': str(e) if 'e' in locals() else 'Unknown error',
-            'duration_ms': (time.perf_counter() - start_time) * 1000,
-            'timestamp': datetime.now()
+            'status': 500,
+            'purchase_times': purchase_time,
+            'response_text': e,
+            'duration_ms': "N/A"
         }
 
-    # Créer des tâches concurrentes
-    tasks = [single_purchase_attempt() for _ in range(attempts)]
-    results = await asyncio.gather(*tasks)
-    
-    # Trier les résultats par timestamp pour avoir le plus rapide
-    valid_results = [r for r in results if not r.get('error', None)]
+async def _first_successful_attempt(lot: int, tasks: List[asyncio.Task], sync_offset: float) -> dict:
+    """Retourne la première tentative réussie d'un lot, sans attendre les plus lentes"""
+    pending = set(tasks)
+    valid_results = []
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            # Seules les réponses JSON valides sont candidates
+            done_results = [r for r in (task.result() for task in done) if 'parsed_response' in r]
+            valid_results.extend(done_results)
+            successful_results = [r for r in done_results if r['success']]
+            if successful_results:
+                # Comparaison sur la durée numérique, formatée uniquement pour le résultat retourné
+                fastest_result = min(successful_results, key=lambda x: x['duration_ms'])
+                logger.info(f"Résultat réussi pour le Lot {lot}: {fastest_result}")
+                return {**fastest_result, 'duration_ms': f"{fastest_result['duration_ms']:.2f}"}
+    finally:
+        # Les tentatives restantes sont inutiles une fois le lot obtenu
+        for task in pending:
+            task.cancel()
+
+    # Aucun succès : retourner la réponse JSON la plus rapide pour garder le motif du refus
     if valid_results:
-        sorted_results = sorted(valid_results, key=lambda x: x['timestamp'])
-        return sorted_results[0]
+        fastest_result = min(valid_results, key=lambda x: x['duration_ms'])
+        return {
+            **fastest_result,
+            'duration_ms': f"{fastest_result['duration_ms']:.2f}",
+            'sync_offset_ms': sync_offset * 1000
+        }
 
-    return None
+    return {
+        'lot': lot,
+        'sync_offset_ms': sync_offset * 1000,
+        'success': False,
+        'error': 'Toutes les tentatives ont échoué'
+    }
 
 async def perform_synchronized_purchase(
     session: aiohttp.ClientSession,
     base_url: str,
     csrf_token: str,
-    lot: int,
+    lots: List[int],
     password: str,
-    purchase_time: datetime
-) -> dict:
-    """Synchronise l'achat avec pré-initialisation des connexions"""
+    purchase_time: datetime,
+    attempts: int = _PURCHASE_ATTEMPTS,
+    json_body: bool = False,
+    http2: bool = False
+) -> List[dict]:
+    """Synchronise l'achat de tous les lots partageant la même échéance, avec pré-initialisation des connexions"""
     purchase_url = urljoin(base_url, 'achat/action')
 
-    # Calcul précis du temps d'attente
+    # Calcul précis du temps d'attente, converti en échéance sur l'horloge monotone de la boucle
+    loop = asyncio.get_running_loop()
     time_to_wait = (purchase_time - datetime.now()).total_seconds()
-    logger.info(f"Préparation achat Lot {lot}")
+    deadline = loop.time() + time_to_wait
+    logger.info(f"Préparation achat Lots {lots}")
     logger.info(f"Temps d'attente: {time_to_wait} secondes")
     
-    # Pré-initialisation des connexions TCP
+    # Pré-initialisation des connexions TCP : une connexion keep-alive par tentative
     async def warmup_connection():
-        async with session.get(base_url, timeout=aiohttp.ClientTimeout(total=2)) as response:
-            await response.text()
-    
-    # Préparer les connexions 5 secondes avant l'achat
-    while (purchase_time - datetime.now()).total_seconds() > 3:
-        await asyncio.sleep(0.001)  # Attente plus courte pour plus de précision
-        
-    logger.debug(f"Pré-initialisation des connexions pour Lot {lot}")
-    await warmup_connection()
+        async with session.head(purchase_url, allow_redirects=False, timeout=aiohttp.ClientTimeout(total=2)) as response:
+            await response.release()
     
-    # Préparation des données de la requête
-    purchase_data = {
-        'ceo_csrf_token': csrf_token,
-        'lot': str(lot),
-        'code': password
-    }
-    
-    # Synchronisation fine
-    while datetime.now() < purchase_time:
-        await asyncio.sleep(0.001)  # Attente plus courte pour plus de précision
-    
-    sync_offset = (datetime.now() - purchase_time).total_seconds()
-    logger.info(f"Décalage réel de synchronisation: {sync_offset * 1000:.2f} ms")
+    # Préparer les connexions 3 secondes avant l'achat (un seul réveil programmé)
+    await asyncio.sleep(max(0, deadline - _WARMUP_LEAD - loop.time()))
+
+    # Recalage sur l'horloge murale après la longue attente (corrections NTP, dérive)
+    deadline = loop.time() + (purchase_time - datetime.now()).total_seconds()
+
+    # HTTP/2 : toutes les tentatives multiplexées sur une seule connexion, si elle est bien négociée
+    client = None
+    if http2:
+        logger.debug(f"Pré-initialisation de la connexion HTTP/2 pour Lots {lots}")
+        # Pré-initialisation bornée comme warmup_connection, et jamais au-delà de l'échéance
+        warmup_timeout = min(2.0, deadline - _FINAL_SPIN - loop.time())
+        client = await _open_http2_client(session, base_url, warmup_timeout)
+    if client is None:
+        warmup_count = attempts * len(lots)
+        limit_per_host = session.connector.limit_per_host
+        if limit_per_host and warmup_count > limit_per_host:
+            logger.warning(
+                f"{warmup_count} tentatives pour Lots {lots} mais limit_per_host={limit_per_host} : "
+                f"{warmup_count - limit_per_host} tentatives attendront une connexion libre"
+            )
+            warmup_count = limit_per_host
+        logger.debug(f"Pré-initialisation de {warmup_count} connexions pour Lots {lots}")
+        warmup_results = await asyncio.gather(
+            *[warmup_connection() for _ in range(warmup_count)],
+            return_exceptions=True
+        )
+        for warmup_result in warmup_results:
+            if isinstance(warmup_result, Exception):
+                logger.warning(f"Échec de pré-initialisation pour Lots {lots}: {warmup_result}")
     
-    # Création des coroutines de requête à l'avance
-    start_time = time.perf_counter()
-    async def make_request():
+    # Création des tâches à l'avance, bloquées sur un signal de départ commun à tous les lots
+    start_gun = asyncio.Event()
+    purchase_headers = _PURCHASE_JSON_HEADERS if json_body else _PURCHASE_HEADERS
+    if client is not None:
+        post = functools.partial(_httpx_post, client, purchase_url)
+    else:
+        post = functools.partial(_aiohttp_post, session, purchase_url)
+
+    async def gated_request(purchase_body: bytes, lot: int):
+        await start_gun.wait()
+        return await _purchase_attempt(
+            functools.partial(post, purchase_body, purchase_headers), lot, purchase_time
+        )
+
+    tasks = []
+    for lot in lots:
+        # Préparation des données de la requête
+        purchase_data = {
+            'ceo_csrf_token': csrf_token,
+            'lot': str(lot),
+            'code': password
+        }
+        # Corps JSON si l'endpoint l'accepte, sinon formulaire urlencodé
+        if json_body:
+            purchase_body = orjson.dumps(purchase_data)
+        else:
+            purchase_body = urlencode(purchase_data).encode('ascii')
+        tasks.extend(asyncio.create_task(gated_request(purchase_body, lot)) for _ in range(attempts))
+
+    try:
         try:
-            logger.info(f"Tentative d'achat pour le Lot {lot} à {datetime.now().strftime('%H:%M:%S.%f')}")
-            async with session.post(
-                purchase_url,
-                data=purchase_data,
-                timeout=aiohttp.ClientTimeout(total=10),
-                headers={
-                    'Cache-Control': 'no-cache, no-store, must-revalidate',
-                    'Pragma': 'no-cache'
-                }
-            ) as response:
-                response_text = await response.text()
-                request_time = (time.perf_counter() - start_time) * 1000
-                logger.debug(f"Temps de la requête pour le Lot {lot}: {request_time:.2f}ms")
-                logger.debug(f"Statut de la réponse pour Lot {lot}: {response.status}")
-                logger.debug(f"Texte de la réponse: {response_text[:500]}...")
-                
-                return {
-                    'lot': lot,
-                    'success': True,
-                    'status': response.status,
-                    'purchase_times': purchase_time,
-                    'response_text': response_text,
-                    'duration_ms': f"{request_time:.2f}"
-                }
-        except Exception as e:
-            logger.error(f"Erreur de requête: {str(e)}")
-            return {
-                'lot': lot,
-                'success': False,
-                'status': 500,
-                'purchase_times': purchase_time,
-                'response_text': e,
-                'duration_ms': "N/A"
-            }
-    
-    # Lancement simultané des requêtes
-    tasks = [make_request() for _ in range(5)]
-    results = await asyncio.gather(*tasks)
+            # Synchronisation fine : un réveil programmé, puis attente active sur les 2 dernières ms
+            await asyncio.sleep(max(0, deadline - _FINAL_SPIN - loop.time()))
+            while loop.time() < deadline:
+                await asyncio.sleep(0)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+
+        # Lancement simultané des requêtes
+        sync_offset = loop.time() - deadline
+        start_time = time.perf_counter()
+        start_gun.set()
+        lot_results = await asyncio.gather(*[
+            _first_successful_attempt(lot, tasks[i * attempts:(i + 1) * attempts], sync_offset)
+            for i, lot in enumerate(lots)
+        ])
+    finally:
+        if client is not None:
+            await client.aclose()
+    logger.info(f"Décalage réel de synchronisation: {sync_offset * 1000:.2f} ms")
     
     total_time = time.perf_counter() - start_time
-    logger.info(f"Temps total pour la tentatives du Lot {lot}: {total_time}s")
-    
-    # if result['success']:
-    #     return result
-
-    successful_results = [r for r in results if r['success']]
-    if successful_results:
-        logger.info(f"Résultats réussis pour le Lot {lot}: {successful_results}")
-        fastest_result = min(successful_results, key=lambda x: x['duration_ms'])
-        return fastest_result
-    
-    return {
-        'lot': lot,
-        'sync_offset_ms': sync_offset * 1000,
-        'success': False,
-        'error': 'Toutes les tentatives ont échoué'
-    }
+    logger.info(f"Temps total pour les tentatives des Lots {lots}: {total_time}s")
+
+    return lot_results
     
 async def perform_timed_purchase_batch(
     base_url: str,
     login: str,
     password: str,
     lots: List[int],
-    purchase_times: List[datetime]
+    purchase_times: Union[datetime, List[datetime]],
+    json_body: bool = False,
+    http2: bool = False
 ) -> List[dict]:
-    # Login once to get session and CSRF token
-    success, duration, metrics, session, csrf_token = await login_to_website(base_url, login, password)
+    # Shared connector for keep-alive and DNS, but a fresh session (cookies, CSRF token) per batch
+    connector = await get_connector()
+    await pin_dns(base_url)
+    session = get_optimized_session(2.0, connector)
+
+    # Login once to get the CSRF token
+    success, duration, metrics, _, csrf_token = await login_to_website(session, base_url, login, password)
 
     if not success:
         logger.error("Login failed. Cannot proceed with purchases.")
+        await session.close()
         return []
 
     print(f"\nLogin - Performance Metrics:")
@@ -334,15 +525,30 @@ async def perform_timed_purchase_batch(
         print(f"{operation}: {duration*1000:.0f}ms")
     print("\nConnexion réussie !\n")
 
+    # Une seule échéance pour tout le lot, ou une échéance par lot
+    if isinstance(purchase_times, datetime):
+        purchase_times = [purchase_times] * len(lots)
+
+    # Regrouper les lots partageant la même échéance : une seule attente et un seul départ par groupe
+    groups = defaultdict(list)
+    for lot, purchase_time in zip(lots, purchase_times):
+        groups[purchase_time].append(lot)
+
     try:
-        purchase_tasks = [perform_synchronized_purchase(session, base_url, csrf_token, lot, password, purchase_times) for lot in lots]
-        results = await asyncio.gather(*purchase_tasks)
+        purchase_tasks = [
+            perform_synchronized_purchase(
+                session, base_url, csrf_token, group_lots, password, purchase_time,
+                json_body=json_body, http2=http2
+            )
+            for purchase_time, group_lots in groups.items()
+        ]
+        group_results = await asyncio.gather(*purchase_tasks)
+        results = [result for group in group_results for result in group]
 
     except Exception as e:
         logger.error(f"Error in purchase batch: {e}")
         results = []
     finally:
-        if session:
-            await session.close()
+        await session.close()
 
     return results
@@ -0,0 +1,28 @@
+import atexit
+import logging
+import logging.handlers
+import queue
+from typing import Optional
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+def setup_logging(level: int = logging.INFO, log_file: str = 'purchase_log.txt') -> None:
+    """Configure le logging une seule fois, écriture disque déportée sur un thread dédié"""
+    global _listener
+    if _listener is not None:
+        return
+
+    # Les écritures fichier bloquantes sont traitées par le QueueListener, hors de la boucle d'événements
+    log_queue = queue.Queue()
+    _listener = logging.handlers.QueueListener(log_queue, logging.FileHandler(log_file))
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    logging.basicConfig(
+        level=level,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.handlers.QueueHandler(log_queue),
+            logging.StreamHandler()
+        ]
+    )
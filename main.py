@@ -1,33 +1,110 @@
-from fastapi import FastAPI, BackgroundTasks
+from fastapi import FastAPI, BackgroundTasks, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from datetime import datetime
+from contextlib import asynccontextmanager
 import logging
-from typing import List
+import os
+from typing import List, Optional, Union
+from collections import OrderedDict
 from uuid import uuid4
 from dotenv import dotenv_values
 config = dotenv_values(".env")
 
-# Importez vos fonctions existantes
-from function import perform_timed_purchase_batch
-
-# Configuration du logging
-logging.basicConfig(level=logging.INFO)
+# Configuration du logging, une seule fois pour toute l'application
+from logging_config import setup_logging
+setup_logging()
 logger = logging.getLogger(__name__)
 
+# Importez vos fonctions existantes
+from function import perform_timed_purchase_batch, get_connector, close_connector
+
 # Configuration constantes
 BASE_URL = config["BASE_URL"]
 LOGIN = config["LOGIN"]
 PASSWORD = config["PASSWORD"]
-
-# Dictionnaire pour stocker les résultats des achats
-purchase_results = {}
+# Corps d'achat en JSON plutôt qu'en formulaire, si l'endpoint l'accepte
+PURCHASE_JSON = config.get("PURCHASE_JSON", "false").lower() in ("1", "true", "yes")
+# Tentatives multiplexées en HTTP/2 (httpx) si le serveur le supporte
+PURCHASE_HTTP2 = config.get("PURCHASE_HTTP2", "false").lower() in ("1", "true", "yes")
+# Cœur CPU dédié au worker (optionnel, aucun épinglage par défaut)
+CPU_CORE = config.get("CPU_CORE")
+
+class ResultsStore:
+    """
+    Stockage borné des résultats d'achats (LRU), les moins récemment utilisés sont évincés en premier
+    """
+    def __init__(self, cap: int = 1024):
+        self._d = OrderedDict()
+        self._cap = cap
+
+    def get(self, key: str) -> Optional[dict]:
+        entry = self._d.get(key)
+        if entry is not None:
+            self._d.move_to_end(key)
+        return entry
+
+    def set(self, key: str, value: dict):
+        self._d[key] = value
+        self._d.move_to_end(key)
+        while len(self._d) > self._cap:
+            self._d.popitem(last=False)
+
+    def update(self, key: str, values: dict):
+        entry = self._d.get(key)
+        if entry is None:
+            logger.warning(f"Résultat {key} introuvable (évincé du stockage), mise à jour ignorée")
+            return
+        entry.update(values)
+        self._d.move_to_end(key)
+
+# Stockage des résultats des achats
+results_store = ResultsStore()
+
+def get_results_store() -> ResultsStore:
+    return results_store
 
 class PurchaseRequest(BaseModel):
     lots: List[int]
     purchase_times: datetime
 
-app = FastAPI()
+def pin_process():
+    """
+    Épingle le worker sur un cœur et augmente sa priorité pour limiter la gigue à l'échéance.
+    Uniquement si CPU_CORE est défini. Sous Linux, l'affinité et la priorité ne s'appliquent
+    qu'au thread appelant (celui de la boucle d'événements) ; les threads créés ensuite,
+    dont ceux de l'exécuteur par défaut, héritent du même masque de cœur.
+    """
+    if not CPU_CORE:
+        return
+
+    if hasattr(os, "sched_setaffinity"):
+        try:
+            core = int(CPU_CORE)
+            os.sched_setaffinity(0, {core})
+            logger.info(f"Worker épinglé sur le cœur {core}")
+        except (OSError, ValueError) as e:
+            logger.warning(f"Épinglage CPU impossible : {e}")
+
+    try:
+        os.nice(-5)
+    except (OSError, AttributeError) as e:
+        # Nécessite CAP_SYS_NICE (ou root), indisponible sous Windows
+        logger.warning(f"Augmentation de priorité impossible : {e}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Crée le connecteur HTTP partagé au démarrage et le ferme à l'arrêt
+    """
+    pin_process()
+    await get_connector()
+    try:
+        yield
+    finally:
+        await close_connector()
+
+app = FastAPI(lifespan=lifespan)
 # Configuration CORS
 app.add_middleware(
     CORSMiddleware,
@@ -39,7 +116,11 @@ app.add_middleware(
 
 
 @app.post("/schedule-purchases")
-async def schedule_purchases(request: PurchaseRequest, background_tasks: BackgroundTasks):
+async def schedule_purchases(
+    request: PurchaseRequest,
+    background_tasks: BackgroundTasks,
+    store: ResultsStore = Depends(get_results_store)
+):
     """
     Endpoint pour planifier des achats avec suivi de résultats
     """
@@ -48,17 +129,18 @@ async def schedule_purchases(request: PurchaseRequest, background_tasks: Backgro
 
     try:
         # Initialiser les résultats avec un statut en attente
-        purchase_results[request_id] = {
+        store.set(request_id, {
             "status": "En attente",
             "lots": request.lots,
             "purchase_times": request.purchase_times,
             "results": None,
             "error": None
-        }
+        })
 
         # Ajoute la tâche à l'arrière-plan
         background_tasks.add_task(
             perform_purchases,
+            store,
             request_id,
             request.lots,
             request.purchase_times
@@ -71,25 +153,27 @@ async def schedule_purchases(request: PurchaseRequest, background_tasks: Backgro
         }
     except Exception as e:
         # En cas d'erreur, mettre à jour les résultats
-        purchase_results[request_id]["status"] = "error"
-        purchase_results[request_id]["error"] = str(e)
+        store.update(request_id, {
+            "status": "error",
+            "error": str(e)
+        })
 
         logger.error(f"Erreur de planification : {e}")
         return {"status": "error", "message": str(e)}
 
 @app.get("/purchase-status/{request_id}")
-async def get_purchase_status(request_id: str):
+async def get_purchase_status(request_id: str, store: ResultsStore = Depends(get_results_store)):
     """
     Endpoint pour récupérer le statut des achats
     """
-    result = purchase_results.get(request_id)
+    result = store.get(request_id)
 
     if not result:
         return {"status": "not_found", "message": "ID de requête invalide"}
 
     return result
 
-async def perform_purchases(request_id: str, lots: List[int], purchase_times: List[datetime]):
+async def perform_purchases(store: ResultsStore, request_id: str, lots: List[int], purchase_times: Union[datetime, List[datetime]]):
     """
     Fonction pour exécuter réellement les achats et mettre à jour les résultats
     """
@@ -99,11 +183,13 @@ async def perform_purchases(request_id: str, lots: List[int], purchase_times: Li
             LOGIN,
             PASSWORD,
             lots,
-            purchase_times
+            purchase_times,
+            json_body=PURCHASE_JSON,
+            http2=PURCHASE_HTTP2
         )
 
         # Mettre à jour les résultats
-        purchase_results[request_id].update({
+        store.update(request_id, {
             "status": 'Succès',
             "results": results
         })
@@ -114,11 +200,11 @@ async def perform_purchases(request_id: str, lots: List[int], purchase_times: Li
 
     except Exception as e:
         # En cas d'erreur, mettre à jour les résultats
-        purchase_results[request_id].update({
+        store.update(request_id, {
             "status": "Erreur",
             "error": str(e)
         })
         logger.error(f"Erreur lors des achats : {e}")
 
-# Lancez avec uvicorn
-# uvicorn main:app --reload
+# Lancez avec uvicorn (la boucle uvloop est sélectionnée par uvicorn, pas à l'import)
+# uvicorn main:app --loop uvloop --http httptools --workers 1